@@ -5,6 +5,7 @@ Optimal Power Flow
 
 from gurobi_optimods.opf.api import compute_violations  # noqa: F401
 from gurobi_optimods.opf.api import solve_opf  # noqa: F401
+from gurobi_optimods.opf.graphics import precompute_coords  # noqa: F401
 from gurobi_optimods.opf.graphics import solution_plot  # noqa: F401
 from gurobi_optimods.opf.graphics import violation_plot  # noqa: F401
 from gurobi_optimods.opf.io import read_case_matpower  # noqa: F401
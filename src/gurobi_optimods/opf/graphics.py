@@ -3,14 +3,46 @@ Contains the plotting API for OPF.
 
 - solution_plot: plot case solution using plotly, highlighting switched off branches
 - violation_plot: plot case solution, highlighting violations
+- precompute_coords: generate bus coordinates once for reuse in later plots
 
 """
 
+import hashlib
+import itertools
+import json
 import math
-import tempfile, os, subprocess
+import pathlib
+import shutil
 from numbers import Number
+
+import numpy as np
+
 from gurobi_optimods.opf import converters, grbgraphical
 
+# Networks up to this many buses use the circle layout without calling sfdp
+CIRCLE_LAYOUT_MAX_BUSES = 40
+
+# Resolve the Graphviz sfdp executable once, None if it is not installed
+_SFDP = shutil.which("sfdp")
+
+# sfdp tuning for large networks: cap the iterations and skip the smoothing
+# pass, overlaps are removed with the (fast) prism algorithm
+_SFDP_LAYOUT_OPTIONS = ["-Goverlap=prism", "-Gsmoothing=none", "-Gmaxiter=200"]
+
+# Fixed part of the solution plot legend, tweak labels as you like
+_LEGEND_HTML = "<br>".join(
+    [
+        "No lines turned off",
+        "",
+        "<b>Bus colors</b>",
+        "Black: generation ≤ 75 & load < 50",
+        '<span style="color:#1f77b4">Blue</span>: generation ≤ 75 & load ≥ 50',
+        '<span style="color:#9467bd">Purple</span>: generation > 75',
+        '<span style="color:#ff7f0e">Orange</span>: generation > 150',
+        '<span style="color:#d62728">Red</span>: generation > 500',
+    ]
+)
+
 
 def solution_plot(
     case,
@@ -18,12 +50,14 @@ def solution_plot(
     coords=None,
     width=1200,
     height=900,
-    keep_obj=True
+    keep_obj=True,
+    max_edges=None,
 ):
     """
     Reads the given case and returns a plotly figure object. Ideally the
     solution has been computed by the ``solve_opf`` function.
-    Generates coords via Graphviz sfdp if coords is None.
+    Generates coords via Graphviz sfdp if coords is None (small networks are
+    placed on a circle instead).
 
     Parameters
     ----------
@@ -38,6 +72,12 @@ def solution_plot(
         Figure size in pixels.
     keep_obj : bool
         Whether to keep the "OBJ ..." annotation.
+    max_edges : int | None
+        Optional limit (at least 1) on the number of drawn line segments for
+        large cases.
+        If the case has more branches, the switched on branches are bundled
+        into at most ``max_edges`` averaged segments. Switched off branches
+        are always drawn individually.
     Returns
     -------
     plotly.graph_objects.Figure
@@ -45,34 +85,41 @@ def solution_plot(
         displaged by calling ``figure.show()``.
     """
 
+    if max_edges is not None and max_edges < 1:
+        raise ValueError(f"max_edges must be at least 1, got {max_edges}")
 
     alldata = converters.convert_case_to_internal_format(case)
 
     alldata["graphical"] = {}
     alldata["graphical"]["numfeatures"] = 0
 
-    if coords == None:
-        coords = _get_coords(case, coords)
-    
+    if coords is None:
+        coords = _get_coords(alldata, None)
+
     converters.grbmap_coords_from_dict(alldata, coords)
 
     # Generate a plotly figure
     fig = grbgraphical.generate_solution_figure(alldata, solution)
 
+    if max_edges is not None and alldata["numbranches"] > max_edges:
+        _bundle_edges(fig, max_edges)
+
     # copy the objective value
     obj_text = None
     for a in getattr(fig.layout, "annotations", []):
         if isinstance(a.text, str) and a.text.strip().startswith("OBJ"):
             obj_text = a.text.strip()
             break
-    _restyle_annotations(fig, obj_text if keep_obj else None)
 
-    fig.update_layout(width=width, height=height,
-                      margin=dict(l=20, r=20, t=20, b=20),
-                      paper_bgcolor="white", plot_bgcolor="white")
-    fig.update_xaxes(visible=False)
-    fig.update_yaxes(visible=False)
-    fig.update_yaxes(scaleanchor="x", scaleratio=1)
+    # Apply all layout changes in one batch
+    with fig.batch_update():
+        _restyle_annotations(fig, obj_text if keep_obj else None)
+
+        fig.update_layout(width=width, height=height,
+                          margin=dict(l=20, r=20, t=20, b=20),
+                          paper_bgcolor="white", plot_bgcolor="white")
+        fig.update_xaxes(visible=False)
+        fig.update_yaxes(visible=False, scaleanchor="x", scaleratio=1)
 
     _tune_traces(fig)
     
@@ -120,94 +167,321 @@ def violation_plot(case, coords, violations):
 
 
 
+def precompute_coords(case):
+    """
+    Generates bus coordinates for the given case, so that they can be stored
+    and passed to ``solution_plot`` or ``violation_plot`` later on. Layouts are
+    computed via Graphviz sfdp if available (results are cached on disk), and
+    fall back to a circle layout otherwise. Networks with at most
+    ``CIRCLE_LAYOUT_MAX_BUSES`` buses always use the circle layout.
+
+    Parameters
+    ----------
+    case : dict
+        Dictionary holding case data
+
+    Returns
+    -------
+    dict
+        Dictionary mapping bus IDs to (lat, lon) coordinates
+    """
 
-# ---------- coordinate from sfdp----------
-def _coords_from_sfdp(case, seed=1234):
-    """Return {bus_i: (lat, lon)} using Graphviz sfdp -Tplain."""
     alldata = converters.convert_case_to_internal_format(case)
-    IDtoCount = alldata["IDtoCountmap"]                # {bus_i -> count}
-    CountToID = {v: k for k, v in IDtoCount.items()}   # {count -> bus_i}
-
-    lines = ["graph G {", 'node [shape=point, height=0, width=0, label=""];']
-    for j in range(1, alldata["numbuses"] + 1):
-        lines.append(f"  {j};")
-    for br in alldata["branches"].values():
-        lines.append(f"  {br.count_f} -- {br.count_t};")
-    lines.append("}")
-
-    with tempfile.TemporaryDirectory() as td:
-        in_path = os.path.join(td, "g.gv")
-        with open(in_path, "w", encoding="utf-8") as f:
-            f.write("\n".join(lines))
-        out = subprocess.check_output(
-            ["sfdp", "-Tplain", f"-Gseed={seed}", in_path],
-            text=True
+    return _get_coords(alldata, None)
+
+
+# ---------- coordinate from sfdp----------
+def _branch_counts(alldata):
+    """Return (count_f, count_t) arrays over all branches, built once per alldata."""
+    if "branchcounts" not in alldata:
+        branches = alldata["branches"].values()
+        alldata["branchcounts"] = (
+            np.fromiter((br.count_f for br in branches), dtype=np.int64),
+            np.fromiter((br.count_t for br in branches), dtype=np.int64),
+        )
+    return alldata["branchcounts"]
+
+
+def _coords_from_sfdp(alldata, seed=1234):
+    """Return {bus_i: (lat, lon)} using Graphviz sfdp -Tplain.
+
+    Each connected component of the network is laid out by its own sfdp
+    process (run in parallel), and the components are then packed next to
+    each other row by row.
+    """
+    if _SFDP is None:
+        raise FileNotFoundError("Graphviz sfdp executable not found")
+
+    # Only import at time of use, users passing coords never need these
+    import concurrent.futures
+    import os
+
+    import scipy.sparse as sp
+    from scipy.sparse import csgraph
+
+    # IDtoCountmap assigns counts 1..n in insertion order, so the bus ID of
+    # count c is at position c - 1
+    ids_by_count = list(alldata["IDtoCountmap"])
+    numbuses = alldata["numbuses"]
+    count_f, count_t = _branch_counts(alldata)
+
+    adjacency = sp.coo_matrix(
+        (np.ones(len(count_f)), (count_f - 1, count_t - 1)),
+        shape=(numbuses, numbuses),
+    )
+    numcomponents, labels = csgraph.connected_components(adjacency, directed=False)
+
+    # Map each bus to its index within its component
+    components = [np.flatnonzero(labels == k) for k in range(numcomponents)]
+    local = np.empty(numbuses, dtype=np.int64)
+    for members in components:
+        local[members] = np.arange(len(members))
+    edge_labels = labels[count_f - 1]
+
+    def layout(k):
+        members = components[k]
+        if len(members) == 1:
+            # Isolated buses do not need sfdp
+            return np.zeros(1), np.zeros(1)
+        mask = edge_labels == k
+        return _sfdp_layout(
+            len(members),
+            local[count_f[mask] - 1] + 1,
+            local[count_t[mask] - 1] + 1,
+            seed,
         )
 
-    x, y = {}, {}
-    for line in out.splitlines():
-        parts = line.split()
-        if len(parts) >= 4 and parts[0] == "node":
-            name = int(parts[1])
-            x[name] = float(parts[2])
-            y[name] = float(parts[3])
-
-    minx, miny = min(x.values()), min(y.values())
-    coords = {}
-    for cnt, X in x.items():
-        Y = y[cnt]
-        Xn, Yn = (X - minx), (Y - miny)
-        bus_i = CountToID[cnt]
-        # Optimods expects (lat, lon) but later uses x=lon, y=lat
-        coords[bus_i] = (Yn, Xn)
+    if numcomponents == 1:
+        layouts = [layout(0)]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(os.cpu_count()) as executor:
+            layouts = list(executor.map(layout, range(numcomponents)))
+
+    # Shelf packing: place components by decreasing height in rows which are
+    # about as wide as the square root of the total area
+    sizes = [(cx.max(), cy.max()) for cx, cy in layouts]
+    gap = 0.05 * max(1.0, max(max(size) for size in sizes))
+    rowwidth = max(
+        max(w for w, _ in sizes),
+        math.sqrt(sum((w + gap) * (h + gap) for w, h in sizes)),
+    )
+    xs, ys = np.empty(numbuses), np.empty(numbuses)
+    offx = offy = rowheight = 0.0
+    for k in sorted(range(numcomponents), key=lambda k: -sizes[k][1]):
+        w, h = sizes[k]
+        if offx > 0 and offx + w > rowwidth:
+            offx, offy, rowheight = 0.0, offy + rowheight + gap, 0.0
+        xs[components[k]] = layouts[k][0] + offx
+        ys[components[k]] = layouts[k][1] + offy
+        offx += w + gap
+        rowheight = max(rowheight, h)
+
+    # Optimods expects (lat, lon) but later uses x=lon, y=lat
+    return dict(zip(ids_by_count, zip(ys.tolist(), xs.tolist())))
+
+
+def _sfdp_layout(numnodes, count_f, count_t, seed):
+    """Lay out nodes 1..numnodes with the given edges, return (xs, ys) arrays
+    in node order, shifted to start at zero."""
+    import subprocess
+
+    # DOT input and plain output are pure ASCII, so work on bytes throughout
+    # and leave any decoding to numpy when parsing the node positions
+    edge_lines = np.char.add(
+        np.char.add(np.char.add(b"  ", count_f.astype("S")), b" -- "),
+        np.char.add(count_t.astype("S"), b";"),
+    )
+    dot = b"\n".join(
+        itertools.chain(
+            [b"graph G {", b'node [shape=point, height=0, width=0, label=""];'],
+            (b"  %d;" % j for j in range(1, numnodes + 1)),
+            edge_lines.tolist(),
+            [b"}"],
+        )
+    )
+
+    # Pipe the graph to sfdp directly rather than through a temporary file
+    out = subprocess.run(
+        [_SFDP, "-Tplain", f"-Gseed={seed}", *_SFDP_LAYOUT_OPTIONS],
+        input=dot,
+        capture_output=True,
+        check=True,
+    ).stdout
+
+    # Plain format node lines read "node name x y width height ...". loadtxt
+    # parses these in compiled code, which is much faster than genfromtxt.
+    node_lines = [line for line in out.splitlines() if line.startswith(b"node ")]
+    nodes = np.loadtxt(
+        node_lines,
+        usecols=(1, 2, 3),
+        dtype=[("n", int), ("x", float), ("y", float)],
+        ndmin=1,
+    )
+    xs, ys = np.empty(numnodes), np.empty(numnodes)
+    xs[nodes["n"] - 1] = nodes["x"] - nodes["x"].min()
+    ys[nodes["n"] - 1] = nodes["y"] - nodes["y"].min()
+    return xs, ys
+
+
+def _coords_cache_dir():
+    """Return the directory for cached sfdp layouts, or None if there is no
+    usable cache location. Follows XDG_CACHE_HOME, defaulting to ~/.cache."""
+    import os
+
+    base = os.environ.get("XDG_CACHE_HOME", "")
+    if os.path.isabs(base):
+        base = pathlib.Path(base)
+    else:
+        # Relative XDG paths are invalid and must be ignored
+        try:
+            base = pathlib.Path.home() / ".cache"
+        except (RuntimeError, KeyError):
+            # No resolvable home directory
+            return None
+        if not base.is_absolute():
+            return None
+    return base / "gurobi-optimods" / "coords"
+
+
+def _coords_from_sfdp_cached(alldata, seed=1234):
+    """Same as _coords_from_sfdp, reusing layouts cached under _coords_cache_dir().
+
+    The cache key only depends on the network topology, so positions are
+    stored in bus count order and mapped back to bus IDs on load.
+    """
+    cache_dir = _coords_cache_dir()
+    if cache_dir is None:
+        return _coords_from_sfdp(alldata, seed=seed)
+
+    count_f, count_t = _branch_counts(alldata)
+    key = hashlib.blake2b(digest_size=16)
+    key.update(f"{seed} {alldata['numbuses']} {_SFDP_LAYOUT_OPTIONS}".encode())
+    key.update(count_f.tobytes())
+    key.update(count_t.tobytes())
+    cache_file = cache_dir / f"{key.hexdigest()}.json"
+    ids_by_count = list(alldata["IDtoCountmap"])
+
+    # Anything but a numbuses x 2 array of finite numbers is a cache miss
+    try:
+        positions = np.asarray(json.loads(cache_file.read_text()), dtype=float)
+    except (OSError, ValueError, TypeError):
+        positions = None
+    if (
+        positions is not None
+        and positions.shape == (alldata["numbuses"], 2)
+        and np.isfinite(positions).all()
+    ):
+        return dict(zip(ids_by_count, map(tuple, positions.tolist())))
+
+    coords = _coords_from_sfdp(alldata, seed=seed)
+    positions = [coords[bus] for bus in ids_by_count]
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        cache_file.write_text(json.dumps(positions))
+    except OSError:
+        # The cache is only an optimization, never fail because of it
+        pass
     return coords
 
 
-def _coords_circle(case):
+def _coords_circle(alldata):
     """If sfdp is missing we make simple circle layout."""
-    alldata = converters.convert_case_to_internal_format(case)
     bus_ids = sorted(alldata["IDtoCountmap"].keys())
-    n = len(bus_ids)
     R = 100.0
-    coords = {}
-    for k, bus in enumerate(bus_ids):
-        theta = 2 * math.pi * k / max(1, n)
-        x = R * math.cos(theta)
-        y = R * math.sin(theta)
-        coords[bus] = (y, x)
-    return coords
+    theta = np.linspace(0.0, 2 * np.pi, len(bus_ids), endpoint=False)
+    xs = R * np.cos(theta)
+    ys = R * np.sin(theta)
+    return dict(zip(bus_ids, zip(ys.tolist(), xs.tolist())))
 
 
-def _get_coords(case, coords):
+def _get_coords(alldata, coords):
+    """Return coords as given, or generate them from the converted case."""
     if coords is not None:
         return coords
+    if _SFDP is None or alldata["numbuses"] <= CIRCLE_LAYOUT_MAX_BUSES:
+        return _coords_circle(alldata)
+
+    import subprocess
+
     try:
-        return _coords_from_sfdp(case)
+        return _coords_from_sfdp_cached(alldata)
     except (FileNotFoundError, subprocess.CalledProcessError):
-        return _coords_circle(case)
+        return _coords_circle(alldata)
+
+
+# ---------- level of detail ----------
+def _bundle_edges(fig, max_edges):
+    """Fold the segments of each background edge trace into at most max_edges
+    segments. End points are snapped to the finest grid which leaves few enough
+    groups, and all segments between the same pair of cells are replaced by
+    their average. Switched off branches (red) are kept as is."""
+    for tr in fig.data:
+        if tr.mode != "lines" or tr.line.color == "red":
+            continue
+
+        # Edge traces hold x0, x1, None for each segment
+        ends = np.stack(
+            [np.asarray(tr.x, dtype=float), np.asarray(tr.y, dtype=float)], axis=1
+        ).reshape(-1, 3, 2)[:, :2, :]
+        numsegments = len(ends)
+        if numsegments <= max_edges:
+            continue
+
+        lo = ends.min(axis=(0, 1))
+        span = np.maximum(ends.max(axis=(0, 1)) - lo, 1e-12)
+        longaxis = int(span[1] > span[0])
+
+        def snap(level):
+            # Grids refine one axis at a time: 1x1, 2x1, 2x2, 3x2, ...
+            cells = np.array([1 + level // 2, 1 + level // 2])
+            cells[longaxis] += level % 2
+            ij = np.minimum(((ends - lo) / span * cells).astype(np.int64), cells - 1)
+            cell = ij[..., 0] * cells[1] + ij[..., 1]
+            groups, inverse = np.unique(
+                np.sort(cell, axis=1), axis=0, return_inverse=True
+            )
+            return cell, groups, inverse.ravel()
+
+        # Bisect for the finest grid with at most max_edges groups, a single
+        # cell always qualifies
+        cell, groups, inverse = snap(0)
+        low, high = 1, 4 * math.isqrt(numsegments) + 4
+        while low <= high:
+            level = (low + high) // 2
+            snapped = snap(level)
+            if len(snapped[1]) <= max_edges:
+                cell, groups, inverse = snapped
+                low = level + 1
+            else:
+                high = level - 1
+
+        # Orient segments from the lower to the higher cell before averaging
+        swap = cell[:, 0] > cell[:, 1]
+        ends[swap] = ends[swap, ::-1]
+        counts = np.bincount(inverse, minlength=len(groups))
+        bundled = np.empty((len(groups), 3, 2))
+        bundled[:, 2, :] = np.nan
+        for end in range(2):
+            for axis in range(2):
+                bundled[:, end, axis] = (
+                    np.bincount(
+                        inverse, weights=ends[:, end, axis], minlength=len(groups)
+                    )
+                    / counts
+                )
+
+        xs, ys = bundled[..., 0].ravel(), bundled[..., 1].ravel()
+        tr.update(
+            x=np.where(np.isnan(xs), None, xs).tolist(),
+            y=np.where(np.isnan(ys), None, ys).tolist(),
+        )
 
 
 # ---------- styling helpers ----------
 def _restyle_annotations(fig, obj_text=None):
     """Replace existing annotations with a tidy block in paper coords."""
     fig.layout.annotations = ()
-    lines = []
-    if obj_text:
-        lines.append(f"<b>{obj_text}</b>")
-        lines.append("")
-
-    # tweak labels as you like
-    lines += [
-        "No lines turned off",
-        "",
-        "<b>Bus colors</b>",
-        "Black: generation ≤ 75 & load < 50",
-        '<span style="color:#1f77b4">Blue</span>: generation ≤ 75 & load ≥ 50',
-        '<span style="color:#9467bd">Purple</span>: generation > 75',
-        '<span style="color:#ff7f0e">Orange</span>: generation > 150',
-        '<span style="color:#d62728">Red</span>: generation > 500',
-    ]
-    txt = "<br>".join(lines)
+    txt = f"<b>{obj_text}</b><br><br>{_LEGEND_HTML}" if obj_text else _LEGEND_HTML
 
     fig.add_annotation(
         xref="paper", yref="paper",
@@ -220,30 +494,43 @@ def _restyle_annotations(fig, obj_text=None):
 
 
 def _tune_traces(fig):
-    """Gentle line+marker scaling; robust to scalar/list sizes."""
-    for tr in fig.data:
-        mode = getattr(tr, "mode", "") or ""
-
-        # Edges (lines)
-        if "lines" in mode and hasattr(tr, "line") and hasattr(tr.line, "width"):
-            try:
-                oldw = float(tr.line.width)
-            except Exception:
-                oldw = 1.0
-            tr.line.width = min(max(0.8, oldw * 1.08), 2.2)
-
-        # Nodes (markers)
-        if "markers" in mode and hasattr(tr, "marker") and hasattr(tr.marker, "size"):
-            s = tr.marker.size
-
-            def bump(v):
-                try:
-                    fv = float(v)
-                except (TypeError, ValueError):
-                    fv = 6.0
-                return min(max(6.0, fv * 1.12), 18.0)
-
-            if isinstance(s, (list, tuple)):
-                tr.marker.size = [bump(v) for v in s]
-            else:
-                tr.marker.size = bump(s)
+    """Gentle line+marker scaling; robust to scalar/list sizes.
+
+    Scatter traces are also swapped for their WebGL counterparts, which keep
+    large networks responsive.
+    """
+    # Only import at time of use, so plotly is not a required dependency
+    import plotly.graph_objects as go
+
+    traces = [
+        go.Scattergl(tr.to_plotly_json()) if tr.type == "scatter" else tr
+        for tr in fig.data
+    ]
+    fig.data = ()
+    fig.add_traces(traces)
+
+    # Edges (lines)
+    fig.for_each_trace(
+        lambda tr: tr.update(line_width=_bump_line_width(tr.line.width)),
+        selector=lambda tr: "lines" in (getattr(tr, "mode", None) or ""),
+    )
+
+    # Nodes (markers)
+    fig.for_each_trace(
+        lambda tr: tr.update(marker_size=_bump_marker_size(tr.marker.size)),
+        selector=lambda tr: "markers" in (getattr(tr, "mode", None) or ""),
+    )
+
+
+def _bump_line_width(width):
+    oldw = float(width) if isinstance(width, Number) else 1.0
+    return min(max(0.8, oldw * 1.08), 2.2)
+
+
+def _bump_marker_size(size):
+    # Per-vertex sizes are scaled as an array, unset sizes count as 6
+    if isinstance(size, (list, tuple, np.ndarray)):
+        sizes = np.nan_to_num(np.asarray(size, dtype=np.float64), nan=6.0)
+        return np.clip(sizes * 1.12, 6.0, 18.0).tolist()
+    oldsize = float(size) if isinstance(size, Number) else 6.0
+    return min(max(6.0, oldsize * 1.12), 18.0)
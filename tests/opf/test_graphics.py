@@ -3,12 +3,20 @@
 
 import gzip
 import json
+import os
 import pathlib
+import tempfile
 import unittest
+from unittest import mock
+
+import numpy as np
 
 from gurobi_optimods.datasets import load_opf_example, load_opf_extra
 from gurobi_optimods.opf import (
     compute_violations,
+    converters,
+    graphics,
+    precompute_coords,
     solution_plot,
     solve_opf,
     violation_plot,
@@ -70,13 +78,29 @@ class TestGraphicsCase9(unittest.TestCase):
 
     def test_solution_plot(self):
         # Plot figure using case, coordinates, solution
-        fig = solution_plot(self.case9, self.case9_coords, self.case9_solution)
+        fig = solution_plot(self.case9, self.case9_solution, self.case9_coords)
 
         # Check whether figure coordinates and scaled input coordinates are the same
         for i in range(9):
             self.assertLess(abs(fig.data[1].x[i] - self.graphics_9_x[i]), 1e-9)
             self.assertLess(abs(fig.data[1].y[i] - self.graphics_9_y[i]), 1e-9)
 
+        # Traces are rendered using WebGL
+        for trace in fig.data:
+            self.assertEqual(trace.type, "scattergl")
+
+        # If set to true, plot opens in browser for manual checking
+        if self.plot_graphics:
+            fig.show()
+
+    def test_solution_plot_generated_coords(self):
+        # Plot figure without coordinates, so they are generated from the case
+        fig = solution_plot(self.case9, self.case9_solution)
+
+        # Every bus should be placed in the figure
+        self.assertEqual(len(fig.data[1].x), 9)
+        self.assertEqual(len(fig.data[1].y), 9)
+
         # If set to true, plot opens in browser for manual checking
         if self.plot_graphics:
             fig.show()
@@ -84,13 +108,79 @@ class TestGraphicsCase9(unittest.TestCase):
     def test_plot_branchswitching(self):
         # Plot figure using case, coordinates, switching solution
         fig = solution_plot(
-            self.case9_switching, self.case9_coords, self.switching_solution
+            self.case9_switching, self.switching_solution, self.case9_coords
         )
 
         # If set to true, plot opens in browser for manual checking
         if self.plot_graphics:
             fig.show()
 
+    def test_plot_max_edges(self):
+        # Plot switching solution with at most 3 bundled background segments
+        full = solution_plot(
+            self.case9_switching, self.switching_solution, self.case9_coords
+        )
+        fig = solution_plot(
+            self.case9_switching,
+            self.switching_solution,
+            self.case9_coords,
+            max_edges=3,
+        )
+
+        for trace, full_trace in zip(fig.data, full.data):
+            if trace.mode != "lines":
+                continue
+            if trace.line.color == "red":
+                # Switched off branches are drawn at full detail
+                self.assertEqual(trace.x, full_trace.x)
+                continue
+
+            # Fewer segments than before, but within the limit
+            numsegments = len(trace.x) // 3
+            self.assertLess(numsegments, len(full_trace.x) // 3)
+            self.assertGreater(numsegments, 1)
+            self.assertLessEqual(numsegments, 3)
+
+            # Bundled end points are averages of the original end points
+            for values, full_values in [
+                (trace.x, full_trace.x),
+                (trace.y, full_trace.y),
+            ]:
+                full_values = [v for v in full_values if v is not None]
+                for v in values:
+                    if v is not None:
+                        self.assertGreaterEqual(v, min(full_values) - 1e-9)
+                        self.assertLessEqual(v, max(full_values) + 1e-9)
+
+        # The limit must allow at least one segment, checked before any work
+        for max_edges in [0, -1]:
+            with mock.patch.object(
+                converters, "convert_case_to_internal_format"
+            ) as convert, self.assertRaisesRegex(
+                ValueError, "max_edges must be at least 1"
+            ):
+                solution_plot(
+                    self.case9_switching,
+                    self.switching_solution,
+                    max_edges=max_edges,
+                )
+            convert.assert_not_called()
+
+        # If set to true, plot opens in browser for manual checking
+        if self.plot_graphics:
+            fig.show()
+
+    def test_tune_traces_without_mode(self):
+        # Traces without a mode attribute are left alone
+        import plotly.graph_objects as go
+
+        fig = go.Figure(
+            [go.Bar(x=[1, 2], y=[3, 4]), go.Scatter(x=[0, 1], y=[0, 1], mode="lines")]
+        )
+        graphics._tune_traces(fig)
+        self.assertEqual(fig.data[0].type, "bar")
+        self.assertEqual(fig.data[1].type, "scattergl")
+
     def test_violation_plot(self):
         # Plot violations figure using case, coordinates, voltage solution
         fig = violation_plot(self.case9, self.case9_coords, self.case9_violations)
@@ -100,6 +190,166 @@ class TestGraphicsCase9(unittest.TestCase):
             fig.show()
 
 
+class TestCoords(unittest.TestCase):
+    def setUp(self):
+        self.case9 = load_opf_example("case9")
+        self.case9_coords = load_opf_extra("case9-coordinates")
+
+    def test_precompute_coords(self):
+        # If sfdp fails, the circle layout is used for each bus
+        alldata = converters.convert_case_to_internal_format(self.case9)
+        with mock.patch.object(
+            graphics, "CIRCLE_LAYOUT_MAX_BUSES", 0
+        ), mock.patch.object(graphics, "_SFDP", "sfdp"), mock.patch.object(
+            graphics, "_coords_from_sfdp_cached", side_effect=FileNotFoundError
+        ) as sfdp:
+            coords = precompute_coords(self.case9)
+        sfdp.assert_called_once()
+        self.assertEqual(coords, graphics._coords_circle(alldata))
+
+    def test_small_case_skips_sfdp(self):
+        # Small networks are placed on a circle without calling sfdp
+        with mock.patch.object(graphics, "_coords_from_sfdp_cached") as sfdp:
+            coords = precompute_coords(self.case9)
+        sfdp.assert_not_called()
+        self.assertEqual(set(coords), set(self.case9_coords))
+
+    def test_sfdp_components(self):
+        # Add a second copy of the network as a separate island
+        case = dict(self.case9)
+        island = [dict(bus, bus_i=bus["bus_i"] + 100, type=1) for bus in case["bus"]]
+        case["bus"] = case["bus"] + island
+        case["branch"] = case["branch"] + [
+            dict(branch, fbus=branch["fbus"] + 100, tbus=branch["tbus"] + 100)
+            for branch in case["branch"]
+        ]
+        alldata = converters.convert_case_to_internal_format(case)
+
+        def layout(numnodes, count_f, count_t, seed):
+            # Every edge stays within its component
+            self.assertLessEqual(count_f.max(), numnodes)
+            self.assertLessEqual(count_t.max(), numnodes)
+            return np.arange(numnodes, dtype=float), np.arange(numnodes, dtype=float)
+
+        with mock.patch.object(graphics, "_SFDP", "sfdp"), mock.patch.object(
+            graphics, "_sfdp_layout", side_effect=layout
+        ) as sfdp:
+            coords = graphics._coords_from_sfdp(alldata)
+
+        # One layout per component, packed without overlapping
+        self.assertEqual(sfdp.call_count, 2)
+        self.assertEqual(len(coords), 18)
+        first = {coords[bus["bus_i"]] for bus in self.case9["bus"]}
+        second = {coords[bus["bus_i"]] for bus in island}
+        self.assertEqual(len(first | second), 18)
+
+    def test_sfdp_missing(self):
+        # Without sfdp no layout work is started
+        alldata = converters.convert_case_to_internal_format(self.case9)
+        with mock.patch.object(graphics, "_SFDP", None), mock.patch.object(
+            graphics, "_sfdp_layout"
+        ) as sfdp:
+            with self.assertRaises(FileNotFoundError):
+                graphics._coords_from_sfdp(alldata)
+        sfdp.assert_not_called()
+
+    def test_sfdp_layout(self):
+        # sfdp may list nodes in any order, positions are returned in node order
+        plain = (
+            b"graph 1 4 3\n"
+            b'node 3 4.5 3 0.05 0.05 "" solid point black lightgrey\n'
+            b'node 1 0.5 1.25 0.05 0.05 "" solid point black lightgrey\n'
+            b'node 2 2 1 0.05 0.05 "" solid point black lightgrey\n'
+            b"edge 1 2 4 0.5 1.25 1 1.2 1.5 1.1 2 1 solid black\n"
+            b"edge 2 3 4 2 1 3 2 3.5 2.5 4.5 3 solid black\n"
+            b"stop\n"
+        )
+        result = mock.Mock(stdout=plain)
+        with mock.patch.object(graphics, "_SFDP", "/usr/bin/sfdp"), mock.patch(
+            "subprocess.run", return_value=result
+        ) as run:
+            xs, ys = graphics._sfdp_layout(
+                3, np.array([1, 2]), np.array([2, 3]), seed=1234
+            )
+
+        args, kwargs = run.call_args
+        self.assertEqual(args[0][:3], ["/usr/bin/sfdp", "-Tplain", "-Gseed=1234"])
+        self.assertEqual(
+            kwargs["input"],
+            b"graph G {\n"
+            b'node [shape=point, height=0, width=0, label=""];\n'
+            b"  1;\n  2;\n  3;\n"
+            b"  1 -- 2;\n  2 -- 3;\n"
+            b"}",
+        )
+
+        # Positions are shifted to start at zero
+        np.testing.assert_allclose(xs, [0.0, 1.5, 4.0])
+        np.testing.assert_allclose(ys, [0.25, 0.0, 2.0])
+
+    def test_sfdp_cache(self):
+        alldata = converters.convert_case_to_internal_format(self.case9)
+        with tempfile.TemporaryDirectory() as tmpdir, mock.patch.dict(
+            os.environ, {"XDG_CACHE_HOME": tmpdir}
+        ), mock.patch.object(
+            graphics, "_coords_from_sfdp", return_value=self.case9_coords
+        ) as sfdp:
+            first = graphics._coords_from_sfdp_cached(alldata)
+            second = graphics._coords_from_sfdp_cached(alldata)
+
+        # sfdp only runs once, the second layout is read from the cache
+        sfdp.assert_called_once()
+        self.assertEqual(first, self.case9_coords)
+        self.assertEqual(second, self.case9_coords)
+
+    def test_sfdp_cache_corrupt(self):
+        alldata = converters.convert_case_to_internal_format(self.case9)
+        with tempfile.TemporaryDirectory() as tmpdir, mock.patch.dict(
+            os.environ, {"XDG_CACHE_HOME": tmpdir}
+        ), mock.patch.object(
+            graphics, "_coords_from_sfdp", return_value=self.case9_coords
+        ) as sfdp:
+            graphics._coords_from_sfdp_cached(alldata)
+            (cache_file,) = pathlib.Path(tmpdir).glob("**/*.json")
+
+            # Unreadable or wrongly shaped cache files count as a cache miss
+            for content in [
+                "not json",
+                json.dumps(list(range(9))),
+                json.dumps([[0.0, 1.0, 2.0]] * 9),
+                json.dumps([["a", "b"]] * 9),
+                json.dumps({"1": [0.0, 1.0]}),
+            ]:
+                cache_file.write_text(content)
+                coords = graphics._coords_from_sfdp_cached(alldata)
+                self.assertEqual(coords, self.case9_coords)
+
+        # sfdp reruns once per corrupt file
+        self.assertEqual(sfdp.call_count, 6)
+
+    def test_sfdp_cache_dir(self):
+        # The cache follows XDG_CACHE_HOME if it is an absolute path
+        with tempfile.TemporaryDirectory() as tmpdir, mock.patch.dict(
+            os.environ, {"XDG_CACHE_HOME": tmpdir}
+        ):
+            self.assertEqual(
+                graphics._coords_cache_dir(),
+                pathlib.Path(tmpdir) / "gurobi-optimods" / "coords",
+            )
+
+        # Without a home directory there is no cache, sfdp is called directly
+        alldata = converters.convert_case_to_internal_format(self.case9)
+        with mock.patch.dict(os.environ, {"XDG_CACHE_HOME": ""}), mock.patch.object(
+            pathlib.Path, "home", side_effect=RuntimeError
+        ), mock.patch.object(
+            graphics, "_coords_from_sfdp", return_value=self.case9_coords
+        ) as sfdp:
+            self.assertIsNone(graphics._coords_cache_dir())
+            coords = graphics._coords_from_sfdp_cached(alldata)
+        sfdp.assert_called_once()
+        self.assertEqual(coords, self.case9_coords)
+
+
 @unittest.skipIf(plotly is None, "plotly is not installed")
 @unittest.skipIf(size_limited_license(), "size-limited-license")
 class TestGraphicsNewYork(unittest.TestCase):
@@ -119,7 +369,7 @@ class TestGraphicsNewYork(unittest.TestCase):
     def test_dc_solution(self):
         # Solve and plot DC solution
         solution = solve_opf(self.case, opftype="DC")
-        fig = solution_plot(self.case, self.coords, solution)
+        fig = solution_plot(self.case, solution, self.coords)
 
         # Test a few coordinates
         self.assertLess(abs(fig.data[1].x[0] - 1381.2), 1e-9)
@@ -133,7 +383,7 @@ class TestGraphicsNewYork(unittest.TestCase):
 
     def test_branchswitching(self):
         # Plot a pre-loaded DC branch switching solution
-        fig = solution_plot(self.case, self.coords, self.switching_solution)
+        fig = solution_plot(self.case, self.switching_solution, self.coords)
 
         # If set to true, plot opens in browser for manual checking
         if self.plot_graphics: